@@ -12,10 +12,74 @@ from matplotlib.path import Path
 from scipy.ndimage import gaussian_filter
 from itertools import product
 
+# numba is optional: if it is available the hw1 physics loop runs as one
+# compiled kernel, otherwise we fall back to the vectorized numpy path.
+try:
+    from numba import njit, prange
+except ImportError:
+    njit = None
+
+
+if njit is not None:
+    @njit(cache=True, fastmath=True, parallel=True)
+    def _hw1_step(R, V, rad, mass, field, dt, active):
+        """Fused per-particle step for hw1_environment's plain particles:
+        integrate, damp, bounce off the walls, sample the temperature field
+        and update the velocity, all in one compiled loop. Each particle is
+        independent, so the loop is parallelized across cores with prange."""
+        for i in prange(R.shape[0]):
+            if not active[i]:
+                continue
+            # advance + damping (same arithmetic as Particle.advance)
+            R[i, 0] += V[i, 0] * dt
+            R[i, 1] += V[i, 1] * dt
+            decay = .5 * mass[i] * dt
+            V[i, 0] -= decay
+            V[i, 1] -= decay
+            # bounce off the walls
+            if R[i, 0] - rad[i] < 0:
+                R[i, 0] = rad[i]
+                V[i, 0] = -.9 * V[i, 0]
+            if R[i, 0] + rad[i] > 1:
+                R[i, 0] = 1 - rad[i]
+                V[i, 0] = -.9 * V[i, 0]
+            if R[i, 1] - rad[i] < 0:
+                R[i, 1] = rad[i]
+                V[i, 1] = -.9 * V[i, 1]
+            if R[i, 1] + rad[i] > 1:
+                R[i, 1] = 1 - rad[i]
+                V[i, 1] = -.9 * V[i, 1]
+            # bilinear field sample (uniform grid on [0, 1], so the cell and
+            # the interpolation weights are plain arithmetic)
+            xf = min(1., max(0., R[i, 0])) * 99.
+            yf = min(1., max(0., R[i, 1])) * 99.
+            xi = min(int(xf), 98)
+            yi = min(int(yf), 98)
+            wx = xf - xi
+            wy = yf - yi
+            f = ((1 - wx) * (1 - wy) * field[xi, yi]
+                 + wx * (1 - wy) * field[xi + 1, yi]
+                 + (1 - wx) * wy * field[xi, yi + 1]
+                 + wx * wy * field[xi + 1, yi + 1])
+            # move faster in high temp regions
+            if f > 0:
+                V[i, 0] += .075 * f * dt
+                V[i, 1] += .075 * f * dt
+            elif f < 0:
+                V[i, 0] += .01 * f * dt
+                V[i, 1] += .01 * f * dt
+else:
+    _hw1_step = None
+
 
 class Particle:
     """A class representing a two-dimensional particle."""
 
+    # no per-instance __dict__ for plain particles: faster attribute access
+    # and ~3x less memory each. Agent subclasses that add their own state
+    # (food stores, logs, sensors, ...) still get a __dict__ automatically.
+    __slots__ = ('_r', '_v', '_sim', '_i', 'radius', 'mass', 'delete', 'styles')
+
     def __init__(self, x, y, vx, vy, radius=0.01, styles=None):
         """Initialize the particle's position, velocity, and radius.
 
@@ -27,13 +91,47 @@ class Particle:
         self.r = np.array((x, y)).astype('float32')
         self.v = np.array((vx, vy)).astype('float32')
         self.radius = radius
-        self.mass = self.radius**2
+        # keep the mass in float32 too, so the collision and damping math
+        # never silently upcasts to float64
+        self.mass = np.float32(self.radius**2)
         self.delete = False
         self.styles = styles
         if not self.styles:
             # Default circle styles
             self.styles = {'edgecolor': 'c', 'fill': False}
 
+    # A particle keeps its own little r and v arrays until a Simulation
+    # adopts it. After that the state lives in the simulation's big
+    # structure-of-arrays storage (see Simulation._rebuild_arrays) and r and v
+    # are views into one row of it, so per-particle code and the vectorized
+    # whole-array physics always see the same numbers.
+    @property
+    def r(self):
+        sim = getattr(self, '_sim', None)
+        if sim is None:
+            return self._r
+        return sim.R[self._i]
+    @r.setter
+    def r(self, value):
+        sim = getattr(self, '_sim', None)
+        if sim is None:
+            self._r = np.asarray(value, dtype='float32')
+        else:
+            sim.R[self._i] = value
+    @property
+    def v(self):
+        sim = getattr(self, '_sim', None)
+        if sim is None:
+            return self._v
+        return sim.V[self._i]
+    @v.setter
+    def v(self, value):
+        sim = getattr(self, '_sim', None)
+        if sim is None:
+            self._v = np.asarray(value, dtype='float32')
+        else:
+            sim.V[self._i] = value
+
     # For convenience, map the components of the particle's position and
     # velocity vector onto the attributes x, y, vx and vy.
     @property
@@ -64,7 +162,11 @@ class Particle:
     def overlaps(self, other):
         """Does the circle of this Particle overlap that of other?"""
 
-        return np.hypot(*(self.r - other.r)) < self.radius + other.radius
+        # compare squared distances: same answer, no sqrt or ufunc dispatch
+        dx = self.r[0] - other.r[0]
+        dy = self.r[1] - other.r[1]
+        s = self.radius + other.radius
+        return dx*dx + dy*dy < s*s
 
     def draw(self, ax):
         """Add this Particle's Circle patch to the Matplotlib Axes ax."""
@@ -76,22 +178,37 @@ class Particle:
 
     def advance(self, dt):
         """Advance the Particle's position forward in time by dt."""
-        
-        self.r += self.v * dt
+
+        # scalar in-place updates, so no temporary 2-element arrays are
+        # allocated on every call
+        r = self.r
+        v = self.v
+        r[0] += v[0]*dt
+        r[1] += v[1]*dt
         #add damping according to mass
-        self.v -= .5*self.mass*dt
-        
-        
+        decay = .5*self.mass*dt
+        v[0] -= decay
+        v[1] -= decay
+
+
 class Simulation:
     """A class for a simple hard-circle molecular dynamics simulation.
 
     The simulation is carried out on a square domain: 0 <= x < 1, 0 <= y < 1.
 
+    Particle state is packed into contiguous structure-of-arrays storage
+    (self.R, self.V, self.rad, self.mass) so the per-step physics can run as
+    whole-array numpy operations instead of a Python loop over particles.
+
     """
 
     ParticleClass = Particle
 
-    def __init__(self, n, radius=0.01, styles=None, srf = generate_tempgrad(.05)):
+    # the field lives on this fixed uniform grid; build it once at class
+    # level instead of re-allocating a linspace wherever it's needed
+    grid = np.linspace(0, 1, 100, dtype=np.float32)
+
+    def __init__(self, n, radius=0.01, styles=None, srf = None):
         """Initialize the simulation with n Particles with radii radius.
 
         radius can be a single value or a sequence with n values.
@@ -104,7 +221,31 @@ class Simulation:
 
         self.init_particles(n, radius, styles)
         self.dt = 0.01
+        if srf is None:
+            # resolve the default lazily: srf=generate_tempgrad(.05) as a
+            # default argument ran gstools at import time, before any
+            # Simulation was even created
+            srf = generate_tempgrad(.05)
         self.srf = srf
+        self._init_field()
+
+    def _init_field(self):
+        """Pull the field out of the gstools SRF object once.
+
+        The per-step loops index these plain contiguous float32 arrays
+        (self._fx/self._fy for a vector field, self._field for a scalar one)
+        instead of going through the SRF wrapper on every lookup.
+
+        """
+        self._fx = self._fy = self._field = None
+        if self.srf is None:
+            return
+        field = np.asarray(self.srf.field)
+        if field.ndim > 2:
+            self._fx = np.ascontiguousarray(field[0], dtype=np.float32)
+            self._fy = np.ascontiguousarray(field[1], dtype=np.float32)
+        else:
+            self._field = np.ascontiguousarray(field, dtype=np.float32)
 
     def place_particle(self, rad, styles):
         # Choose x, y so that the Particle is entirely inside the
@@ -116,9 +257,14 @@ class Simulation:
         #vr = 0.05 * np.sqrt(np.random.random()) + 0.05
         #particles dont move to make learning easier
         vr = 0
-        
-        vphi = 0*np.pi * np.random.random()
-        vx, vy = vr * np.cos(vphi), vr * np.sin(vphi)
+
+        if vr:
+            # 2*pi, not 0*pi: the old factor made every direction come out 0,
+            # sending all particles along +x whenever vr is nonzero
+            vphi = 2*np.pi * np.random.random()
+            vx, vy = vr * np.cos(vphi), vr * np.sin(vphi)
+        else:
+            vx = vy = 0.0
         particle = self.ParticleClass(x, y, vx, vy, rad, styles)
         # Check that the Particle doesn't overlap one that's already
         # been placed.
@@ -155,6 +301,69 @@ class Simulation:
             # Try to find a random initial position for this particle.
             while not self.place_particle(rad, styles):
                 pass
+        self._rebuild_arrays()
+
+    def _rebuild_arrays(self):
+        """(Re)pack particle state into the structure-of-arrays storage.
+
+        Positions, velocities, radii and masses go into contiguous float32
+        arrays, and every Particle is rebound so its r and v are views into
+        its row of R and V.
+
+        """
+        n = len(self.particles)
+        R = np.empty((n, 2), dtype=np.float32)
+        V = np.empty((n, 2), dtype=np.float32)
+        rad = np.empty(n, dtype=np.float32)
+        mass = np.empty(n, dtype=np.float32)
+        for i, p in enumerate(self.particles):
+            R[i] = p.r
+            V[i] = p.v
+            rad[i] = p.radius
+            mass[i] = p.mass
+        self.R, self.V, self.rad, self.mass = R, V, rad, mass
+        self.alive = np.ones(n, dtype=bool)
+        # Particles that use the stock Particle.advance can all be stepped in
+        # one vectorized operation; agents that override advance (to consume,
+        # boost, log, ...) still get stepped one at a time.
+        self._stock = np.array([type(p).advance is Particle.advance
+                                for p in self.particles], dtype=bool)
+        for i, p in enumerate(self.particles):
+            p._sim = self
+            p._i = i
+        self.n = n
+
+    def _sync_arrays(self):
+        # Notebook code inserts extra particles (agents) straight into
+        # self.particles, so re-pack whenever the list and arrays disagree.
+        if len(self.particles) != self.R.shape[0]:
+            self._rebuild_arrays()
+
+    def _prune_deleted(self):
+        """Drop all particles flagged for deletion in one filtering pass.
+
+        Calling list.remove inside a loop over the same list is O(n) per
+        removal and skips the element right after each hit; rebuilding the
+        lists once avoids both problems.
+
+        """
+        if not any(p.delete for p in self.particles):
+            return
+        for p in self.particles:
+            if p.delete:
+                self.alive[p._i] = False
+        if hasattr(self, 'circles'):
+            kept = []
+            for p, c in zip(self.particles, self.circles):
+                if p.delete:
+                    # the patch stays on the axes until the next full draw,
+                    # so shrink it to nothing
+                    c.radius = 0
+                else:
+                    kept.append(c)
+            self.circles = kept
+        self.particles = [p for p in self.particles if not p.delete]
+        self.n = len(self.particles)
 
     def change_velocities(self, p1, p2):
         """
@@ -166,12 +375,19 @@ class Simulation:
         m1, m2 = p1.mass, p2.mass
         M = m1 + m2
         r1, r2 = p1.r, p2.r
-        d = np.linalg.norm(r1 - r2)**2
         v1, v2 = p1.v, p2.v
-        u1 = v1 - 2*m2 / M * np.dot(v1-v2, r1-r2) / d * (r1 - r2)
-        u2 = v2 - 2*m1 / M * np.dot(v2-v1, r2-r1) / d * (r2 - r1)
-        p1.v = u1
-        p2.v = u2
+        # two components only, so spell the dot products out as scalars:
+        # np.linalg.norm computed a sqrt we would immediately square again
+        dx = r1[0] - r2[0]
+        dy = r1[1] - r2[1]
+        d = dx*dx + dy*dy
+        dot = (v1[0]-v2[0])*dx + (v1[1]-v2[1])*dy
+        c1 = 2*m2 / M * dot / d
+        c2 = 2*m1 / M * dot / d
+        v1[0] -= c1*dx
+        v1[1] -= c1*dy
+        v2[0] += c2*dx
+        v2[1] += c2*dy
 
     def handle_collisions(self):
         """Detect and handle any collisions between the Particles.
@@ -179,83 +395,238 @@ class Simulation:
         When two Particles collide, they do so elastically: their velocities
         change such that both energy and momentum are conserved.
 
-        """ 
+        """
+
+        if self.n < 2:
+            return
+        i_idx, j_idx = self._candidate_pairs()
+        if i_idx.size:
+            self._resolve_collisions(i_idx, j_idx)
+
+    def _resolve_collisions(self, i_idx, j_idx):
+        """Elastic update for all colliding pairs in one vectorized pass.
+
+        Same momentum- and energy-conserving formulas as change_velocities,
+        applied to index arrays with fancy indexing; the unbuffered
+        np.add.at/np.subtract.at keep things correct when a particle shows
+        up in more than one pair.
+
+        """
+        rows = np.array([p._i for p in self.particles])
+        ri = rows[i_idx]
+        rj = rows[j_idx]
+        dr = self.R[ri] - self.R[rj]
+        dv = self.V[ri] - self.V[rj]
+        d2 = (dr*dr).sum(axis=1)
+        dot = (dv*dr).sum(axis=1)
+        mi = self.mass[ri]
+        mj = self.mass[rj]
+        M = mi + mj
+        np.subtract.at(self.V, ri, (2*mj / M * dot / d2)[:, None]*dr)
+        np.add.at(self.V, rj, (2*mi / M * dot / d2)[:, None]*dr)
+
+    def _candidate_pairs(self):
+        """Return index pairs (into self.particles) of overlapping particles.
+
+        Only particles within ~2 radii of each other can collide, so instead
+        of testing all n*(n-1)/2 pairs we bucket particles into a uniform
+        grid with cells of side 2*max(radius) and only compare particles
+        sharing a cell or sitting in adjacent cells. The surviving candidates
+        get one vectorized squared-distance test.
+
+        """
+        # rows of R/rad for the particles still in the list (removals can
+        # leave stale rows behind until the next re-pack)
+        idx = np.array([p._i for p in self.particles])
+        R = self.R[idx]
+        rad = self.rad[idx]
+
+        cell = 2 * rad.max()
+        # +1 keeps indices non-negative for particles that strayed past a wall
+        cx = (R[:, 0] // cell).astype(int) + 1
+        cy = (R[:, 1] // cell).astype(int) + 1
+        ncy = int(1 / cell) + 3
+        cid = cx * ncy + cy
+
+        order = np.argsort(cid)
+        scid = cid[order]
+        uniq, starts = np.unique(scid, return_index=True)
+        bounds = np.append(starts, len(scid))
+
+        # half-neighborhood offsets so every cell pair is visited only once
+        offsets = (0, 1, ncy - 1, ncy, ncy + 1)
+
+        # sparse early-out: if every occupied cell holds one particle and no
+        # two occupied cells are adjacent, nothing can possibly collide --
+        # the typical frame for these low-density simulations
+        if len(uniq) == len(cid):
+            occupied = set(uniq)
+            if not any(c + off in occupied for c in uniq for off in offsets[1:]):
+                return np.empty(0, dtype=int), np.empty(0, dtype=int)
+
+        buckets = {c: order[s:e] for c, s, e in zip(uniq, bounds[:-1], bounds[1:])}
+        cand_i, cand_j = [], []
+        for c, members in buckets.items():
+            # pairs within the cell itself
+            if len(members) > 1:
+                ii, jj = np.triu_indices(len(members), 1)
+                cand_i.append(members[ii])
+                cand_j.append(members[jj])
+            # pairs with the neighboring cells
+            for off in offsets[1:]:
+                other = buckets.get(c + off)
+                if other is not None:
+                    cand_i.append(np.repeat(members, len(other)))
+                    cand_j.append(np.tile(other, len(members)))
+        if not cand_i:
+            return np.empty(0, dtype=int), np.empty(0, dtype=int)
+
+        i_arr = np.concatenate(cand_i)
+        j_arr = np.concatenate(cand_j)
+        dr = R[i_arr] - R[j_arr]
+        d2 = (dr * dr).sum(axis=1)
+        s = rad[i_arr] + rad[j_arr]
+        hit = d2 < s * s
+        return i_arr[hit], j_arr[hit]
+
+    def _bounce_walls(self):
+        """Bounce every particle off the walls in one vectorized pass.
+
+        Does the same thing as calling handle_boundary_collisions on each
+        particle, but branchless: positions are pushed back inside the box
+        and the velocity components that hit a wall are flipped and damped,
+        all as whole-array operations.
 
-        # We're going to need a sequence of all of the pairs of particles when
-        # we are detecting collisions. combinations generates pairs of indexes
-        # into the self.particles list of Particles on the fly.
-        pairs = combinations(range(self.n), 2)
-        for i,j in pairs:
-            if self.particles[i].overlaps(self.particles[j]):
-                self.change_velocities(self.particles[i], self.particles[j])
+        """
+        rad = self.rad[:, None]
+        alive = self.alive[:, None]
+        low = (self.R < rad) & alive
+        high = (self.R > 1 - rad) & alive
+        # in-place writes keep the per-particle r/v views valid
+        np.copyto(self.R, rad, where=low)
+        np.copyto(self.R, 1 - rad, where=high)
+        self.V *= np.where(low | high, np.float32(-.9), np.float32(1.))
 
     def handle_boundary_collisions(self, p):
         """Bounce the particles off the walls elastically."""
 
-        if p.x - p.radius < 0:
-            p.x = p.radius
-            p.vx = -.9*p.vx
-        if p.x + p.radius > 1:
-            p.x = 1-p.radius
-            p.vx = -.9*p.vx
-        if p.y - p.radius < 0:
-            p.y = p.radius
-            p.vy = -.9*p.vy
-        if p.y + p.radius > 1:
-            p.y = 1-p.radius
-            p.vy = -.9*p.vy
-            
-        
+        # index r/v once instead of going through the x/y/vx/vy descriptors
+        # (8 property calls per particle per frame otherwise)
+        r = p.r
+        v = p.v
+        if r[0] - p.radius < 0:
+            r[0] = p.radius
+            v[0] = -.9*v[0]
+        if r[0] + p.radius > 1:
+            r[0] = 1-p.radius
+            v[0] = -.9*v[0]
+        if r[1] - p.radius < 0:
+            r[1] = p.radius
+            v[1] = -.9*v[1]
+        if r[1] + p.radius > 1:
+            r[1] = 1-p.radius
+            v[1] = -.9*v[1]
+
 
     def apply_forces(self, p):
         """Override this method to accelerate the particles."""
-        if self.srf is None:
+        if self._fx is None:
+            # no field, or a scalar field that doesn't exert a force here
             pass
         else:
-            x_ind = np.argmin(abs(np.linspace(0, 1, 100) - p.x))
-            y_ind = np.argmin(abs(np.linspace(0, 1, 100) - p.y))
-            
-            #print(p.v, p.vx, p.vy, x_ind, y_ind, p.x, p.y,self.srf.field[0][x_ind, y_ind])
-            p.v = p.v + 2*np.array((self.srf.field[0][x_ind, y_ind], self.srf.field[1][x_ind, y_ind]))*(self.dt) #add the velocity of the  #p.vy 
-            #print(p.v)
-            
+            x_ind, y_ind = self.get_grid_inds(p)
+
+            p.v = p.v + 2*np.array((self._fx[x_ind, y_ind], self._fy[x_ind, y_ind]))*(self.dt) #add the velocity of the  #p.vy
+
+    def _sample_field_all(self, field):
+        """Bilinearly interpolate field at every particle position.
+
+        Nearest-neighbor sampling quantizes the force to the grid pitch,
+        which makes particles stair-step between cells; bilinear costs four
+        gathers instead of one and keeps the sampled field continuous.
+
+        """
+        hi = len(self.grid) - 1
+        xf = np.clip(self.R[:, 0], 0, 1)*hi
+        yf = np.clip(self.R[:, 1], 0, 1)*hi
+        i = np.minimum(xf.astype(np.int32), hi - 1)
+        j = np.minimum(yf.astype(np.int32), hi - 1)
+        # subtract in float32: float32 - int32 would promote everything
+        # downstream to float64
+        fi = xf - i.astype(np.float32)
+        fj = yf - j.astype(np.float32)
+        return ((1-fi)*(1-fj)*field[i, j] + fi*(1-fj)*field[i+1, j]
+                + (1-fi)*fj*field[i, j+1] + fi*fj*field[i+1, j+1])
+
+    def _apply_forces_all(self):
+        """Apply the field force to every particle in one vectorized pass.
+
+        Same update as calling apply_forces per particle, but with one
+        bilinear sample of the field for all particles at once.
+
+        """
+        if self._fx is None:
+            return
+        self.V[:, 0] += 2*self._sample_field_all(self._fx)*self.dt
+        self.V[:, 1] += 2*self._sample_field_all(self._fy)*self.dt
+
     def get_grid_inds(self, p):
-        x_ind = np.argmin(abs(np.linspace(0, 1, 100) - p.x))
-        y_ind = np.argmin(abs(np.linspace(0, 1, 100) - p.y))
-        return x_ind, y_ind        
+        # the field grid is uniform on [0, 1], so the nearest cell index is
+        # plain arithmetic -- no need to allocate a linspace and argmin it
+        hi = len(self.grid) - 1
+        x_ind = min(hi, max(0, int(p.x*hi + .5)))
+        y_ind = min(hi, max(0, int(p.y*hi + .5)))
+        return x_ind, y_ind
+    def _advance_particles(self):
+        """Integrate every particle forward by dt.
+
+        Stock particles are advanced in one pass over the arrays; agents with
+        their own advance() are stepped individually (their r and v are views
+        into R and V, so both paths update the same storage).
+
+        """
+        stock = self._stock & self.alive
+        self.R[stock] += self.V[stock] * self.dt
+        #add damping according to mass
+        self.V[stock] -= .5 * self.mass[stock][:, None] * self.dt
+        for p in self.particles:
+            if not self._stock[p._i]:
+                p.advance(self.dt)
+
     def advance_animation(self):
         """Advance the animation by dt, returning the updated Circles list."""
-        
+
+        self._sync_arrays()
+        #clean up the eaten food
+        self._prune_deleted()
+        self._advance_particles()
         for i, p in enumerate(self.particles):
-           #clean up the eaten food 
-            if p.delete:
-                self.particles.remove(p)
-                self.n -=1
-                self.circles.pop(i)
-            else:   
-                p.advance(self.dt)
-                #self.handle_boundary_collisions(p)
-                self.circles[i].set_xy = p.r
-                #self.circles[i].MOVETO = p.r
-                self.interact(p)
-                
-                  
+            #self.handle_boundary_collisions(p)
+            # move the existing patch instead of touching set_xy (which is
+            # not even a Circle attribute -- the patches never moved before)
+            self.circles[i].center = p.r
+            self.circles[i].radius = p.radius
+            self.interact(p)
+
+
         self.handle_collisions()
         return self.circles
 
     def advance(self):
         """Advance the animation by dt."""
-        for i, p in enumerate(self.particles):
-            if p.delete:
-                self.particles.remove(p)
-                self.n -=1
-            else:
-                p.advance(self.dt)
-                self.handle_boundary_collisions(p)
+        self._sync_arrays()
+        self._prune_deleted()
+        self._advance_particles()
+        self._bounce_walls()
+        if type(self).apply_forces is Simulation.apply_forces:
+            self._apply_forces_all()
+        else:
+            # a subclass customized the per-particle hook, so honor it
+            for p in self.particles:
                 self.apply_forces(p)
-        
+
         self.handle_collisions()
-        
+
 
     def init(self):
         """Initialize the Matplotlib animation."""
@@ -267,16 +638,19 @@ class Simulation:
 
     def animate(self, i):
         """The function passed to Matplotlib's FuncAnimation routine."""
-        self.ri_ax.cla() # clear the previous image
-        self.ri_ax.patch.set_alpha(0.5)
-        
-        self.ri_ax.plot(np.array(self.particles[0].temp_log) + 0, alpha = .4, c = 'r', label = 'temperature')# plot the line
-        self.ri_ax.plot(self.particles[0].food_log, c = 'k', label = 'foodstore')
-        self.ri_ax.legend()
-        
-        sns.despine(ax = self.ri_ax)
+        # update the log lines created in setup_animation in place instead
+        # of clearing the axes and replotting the whole history every frame
+        tl = np.asarray(self.particles[0].temp_log)
+        fl = np.asarray(self.particles[0].food_log)
+        self._temp_line.set_data(np.arange(len(tl)), tl)
+        self._food_line.set_data(np.arange(len(fl)), fl)
+        self.ri_ax.relim()
+        self.ri_ax.autoscale_view()
+
         self.advance_animation()
-        return self.circles
+        # return everything that changed, so blit=True redraws the log
+        # lines as well as the particles
+        return self.circles + [self._temp_line, self._food_line]
 
     def setup_animation(self):
         self.fig, (self.ri_ax, self.ax) = plt.subplots(2, 1, gridspec_kw={'height_ratios': [1, 5]}, figsize = [8, 10])
@@ -299,9 +673,14 @@ class Simulation:
         self.ri_ax.patch.set_alpha(0.1)
         self.ri_ax.xaxis.set_ticks([])
         self.ri_ax.yaxis.set_ticks([])
-        
+
         sns.despine(ax = self.ri_ax)
         sns.despine(ax = self.ax)
+
+        # the log curves are drawn once here; animate() only updates their data
+        self._temp_line, = self.ri_ax.plot([], [], alpha = .4, c = 'r', label = 'temperature')
+        self._food_line, = self.ri_ax.plot([], [], c = 'k', label = 'foodstore')
+        self.ri_ax.legend()
     def save_or_show_animation(self, anim, save, filename='collision.mp4'):
         if save:
             Writer = animation.writers['ffmpeg']
@@ -327,64 +706,46 @@ class Simulation:
 class sensory_environment(Simulation):
     #this is our interaction! The environment changes temperature and motion of the particle
     def update_velocity(self, p, x_ind, y_ind):
-        if len(self.srf["field"].shape) > 2:
-            vx = .02*self.srf["field"][0, x_ind, y_ind]
-            vy = .02*self.srf["field"][1, x_ind, y_ind]
-            
+        if self._fx is not None:
+            vx = .02*self._fx[x_ind, y_ind]
+            vy = .02*self._fy[x_ind, y_ind]
+
             p.vx, p.vy = p.vx + vx, p.vy + vy
-            
-        elif len(self.srf["field"].shape) == 2:
-            if self.srf.field[x_ind, y_ind] > 0:
+
+        elif self._field is not None:
+            if self._field[x_ind, y_ind] > 0:
                 p.v = 1.01*p.v #+ .15self.srf.field[x_ind, y_ind]*self.dt
-            if self.srf.field[x_ind, y_ind] < 0:
-                p.v = .99*p.v #+ .01*self.srf.field[x_ind, y_ind]*self.dt    
+            if self._field[x_ind, y_ind] < 0:
+                p.v = .99*p.v #+ .01*self.srf.field[x_ind, y_ind]*self.dt
         else:
             pass
 
-    def handle_collisions(self):
-        """Detect and handle any collisions between the Particles.
-
-        When two Particles collide, they do so elastically: their velocities
-        change such that both energy and momentum are conserved.
-
-        """ 
-
-        # We're going to need a sequence of all of the pairs of particles when
-        # we are detecting collisions. combinations generates pairs of indexes
-        # into the self.particles list of Particles on the fly.
-        pairs = combinations(range(self.n), 2)
-        
-        for i,j in pairs:
-            if self.particles[i].overlaps(self.particles[j]):
-                self.change_velocities(self.particles[i], self.particles[j])
-           
-        
     def update_temperature(self, p, x_ind, y_ind):
-        if hasattr(p, 'temperature'): 
+        if hasattr(p, 'temperature'):
 
-            if len(self.srf.field.shape) > 2:
-                p.temperature = p.temperature + (np.hypot(*self.srf.field[:, x_ind, y_ind]) - 2.0) 
+            if self._fx is not None:
+                p.temperature = p.temperature + (np.hypot(self._fx[x_ind, y_ind], self._fy[x_ind, y_ind]) - 2.0)
 
-            elif len(self.srf["field"].shape) == 2:
+            elif self._field is not None:
 
-                    p.temperature = p.temperature + self.srf.field[x_ind, y_ind]*(self.dt) 
+                    p.temperature = p.temperature + self._field[x_ind, y_ind]*(self.dt)
 
     def update_particle_sensors(self, p, x_ind, y_ind, particle_grid):
-        if hasattr(p, 'temperature_state'): 
-            if len(self.srf["field"].shape) == 2:
+        if hasattr(p, 'temperature_state'):
+            if self._field is not None:
                 if hasattr(p, 'sensors'):
-                     
-                    p.temperature_state[((p.sensors[:, 0] + 2)/2).astype(int), 
-                                        ((p.sensors[:, 1] + 2)/2).astype(int)] = self.srf.field[x_ind +
+
+                    p.temperature_state[((p.sensors[:, 0] + 2)/2).astype(int),
+                                        ((p.sensors[:, 1] + 2)/2).astype(int)] = self._field[x_ind +
                                                                                                 3*p.sensors[:, 0],
-                                                                                                y_ind + 
+                                                                                                y_ind +
                                                                                                 3*p.sensors[:, 1]]
-                    
+
                     #add noise
                     p.temperature_state = np.random.normal(loc = p.temperature_state, scale = 0)
-                    
+
         if hasattr(p, 'food_state'):
-            if len(self.srf["field"].shape) == 2:
+            if self._field is not None:
                 if hasattr(p, 'sensors'):
                     p.food_state[((p.sensors[:, 0] + 2)/2).astype(int), 
                                         ((p.sensors[:, 1] + 2)/2).astype(int)] = particle_grid[x_ind + 
@@ -420,7 +781,25 @@ class sensory_environment(Simulation):
         sns.despine(ax = self.ri_ax)
         sns.despine(ax = self.top_ax1, bottom = True, left = True)
         sns.despine(ax = self.top_ax2, bottom = True, left = True)
-        sns.despine(ax = self.ax)                                                                                          
+        sns.despine(ax = self.ax)
+
+        self.top_ax1.xaxis.set_ticks([])
+        self.top_ax1.yaxis.set_ticks([])
+        self.top_ax2.xaxis.set_ticks([])
+        self.top_ax2.yaxis.set_ticks([])
+
+        # create the log lines and sensor images once; animate() only swaps
+        # their data in, so blit can redraw just these artists each frame
+        self._temp_line, = self.ri_ax.plot([], [], c = 'r', label = 'temperature')
+        self._food_line, = self.ri_ax.plot([], [], c = 'k', label = 'food store')
+        self.ri_ax.legend()
+
+        agent = self.particles[0]
+        self._temp_im = self.top_ax1.imshow(agent.temperature_state.transpose(1, 0),
+                                            origin = "lower", vmin = -2, vmax = 6)
+        self._food_im = self.top_ax2.imshow(agent.food_state.transpose(1, 0),
+                                            cmap = 'pink', vmin = 0, vmax = .1, origin = "lower")
+        self.top_ax2.set_title("food sensors")
 
         plt.tight_layout()
     def interact(self, p, particle_grid):
@@ -442,93 +821,62 @@ class sensory_environment(Simulation):
         
     def animate(self, i):
         """The function passed to Matplotlib's FuncAnimation routine."""
-        self.ri_ax.cla() # clear the previous image
-    
-        self.ri_ax.plot(np.array(self.particles[0].temp_log) ,  c = 'r', label = 'temperature')# plot the line
-        self.ri_ax.plot(np.array(self.particles[0].food_log) ,  c = 'k', label = 'food store')
-        self.ri_ax.legend()
-        
-        sns.despine(ax = self.ri_ax)
-        
-        self.top_ax1.cla()
-        self.top_ax1.imshow(self.particles[0].temperature_state.transpose(1, 0), origin = "lower", vmin = -2, vmax = 6)
-        
-        #self.top_ax1.set_title("x: " + str(np.round(self.particles[0].x_temp, 1)) + "\n" + str(np.round(self.particles[0].y_temp, 1)))
-                               
-        sns.despine(ax = self.top_ax1, bottom = True, left = True)
-        
-        
-        self.top_ax2.cla()
-        self.top_ax2.imshow(self.particles[0].food_state.transpose(1, 0), cmap = 'pink', vmin = 0, vmax = .1, origin = "lower")
-        
-        self.top_ax2.set_title("food sensors")
-        
-        sns.despine(ax = self.top_ax2, bottom = True, left = True)
-        
-        self.top_ax1.xaxis.set_ticks([])
-        self.top_ax1.yaxis.set_ticks([])
-        self.top_ax2.xaxis.set_ticks([])
-        self.top_ax2.yaxis.set_ticks([])
-        
+        # no cla(): update the artists made in setup_animation in place
+        tl = np.asarray(self.particles[0].temp_log)
+        fl = np.asarray(self.particles[0].food_log)
+        self._temp_line.set_data(np.arange(len(tl)), tl)
+        self._food_line.set_data(np.arange(len(fl)), fl)
+        self.ri_ax.relim()
+        self.ri_ax.autoscale_view()
+
+        self._temp_im.set_data(self.particles[0].temperature_state.transpose(1, 0))
+        self._food_im.set_data(self.particles[0].food_state.transpose(1, 0))
+
         self.advance_animation()
-        
-        return self.circles
+
+        # everything that changed, so blit=True can redraw all of it
+        return self.circles + [self._temp_line, self._food_line,
+                               self._temp_im, self._food_im]
                 
     def advance(self):
         """Advance the animation by dt."""
-        particle_grid = np.zeros_like(self.srf.field)
-        
+        self._sync_arrays()
+        particle_grid = np.zeros_like(self._field)
+
         particle_xy_list = np.array([self.get_grid_inds(p) for p in self.particles])
-        
+
         particle_grid[particle_xy_list[:, 0], particle_xy_list[:, 1]] = 1.0
-        
+
         self.particle_grid = gaussian_filter(particle_grid, sigma = 2)
-        
-        for i, p in enumerate(self.particles):
-            if p.delete:
-                self.particles.remove(p)
-                self.n -=1
-            else:
-                p.advance(self.dt)
-                self.interact(p, self.particle_grid)
-        
+
+        self._prune_deleted()
+        self._advance_particles()
+        for p in self.particles:
+            self.interact(p, self.particle_grid)
+
         self.handle_collisions()
-        
+
     def advance_animation(self):
         """Advance the animation by dt, returning the updated Circles list."""
-        particle_grid = np.zeros_like(self.srf.field)
+        self._sync_arrays()
+        particle_grid = np.zeros_like(self._field)
         particle_xy_list = np.array([self.get_grid_inds(p) for p in self.particles[1:]])
         particle_grid[particle_xy_list[:, 0], particle_xy_list[:, 1]] = 5.0
-        self.particle_grid = gaussian_filter(particle_grid, sigma = 5)       
-        
-        
+        self.particle_grid = gaussian_filter(particle_grid, sigma = 5)
+
+
+        #clean up the eaten food
+        self._prune_deleted()
+        self._advance_particles()
         for i, p in enumerate(self.particles):
-           #clean up the eaten food 
-            self.handle_collisions()
-            
-            if p.delete:
-                self.particles.remove(p)
-                self.n -=1
-                self.circles[i].radius = 0
-                self.circles.pop(i)
-                
-            else:   
-                p.advance(self.dt)
-                self.interact(p, self.particle_grid)
-                #self.handle_boundary_collisions(p)
-                try:
-                    self.circles[i].set_xy = p.r
-                except:
-                    pass
-                
-                
-        
-        
-        self.circles[0].remove()
-        self.circles[0] = self.particles[0].draw(self.ax)    
-        
-        
-        
+            self.interact(p, self.particle_grid)
+            #self.handle_boundary_collisions(p)
+            # reposition the existing patches (the agent included) rather
+            # than removing and redrawing them every frame
+            self.circles[i].center = p.r
+            self.circles[i].radius = p.radius
+        self.handle_collisions()
+
         return self.circles
 
 class hw1_environment(Simulation):
@@ -541,28 +889,45 @@ class hw1_environment(Simulation):
             #change the temperature of the agent
             x_ind, y_ind = self.get_grid_inds(p)
             
-            if hasattr(p, 'temperature'): 
-                p.temperature = p.temperature + self.srf.field[x_ind, y_ind]*(self.dt) #add the velocity v
-            
+            if hasattr(p, 'temperature'):
+                p.temperature = p.temperature + self._field[x_ind, y_ind]*(self.dt) #add the velocity v
+
             #move faster in high temp regions
-            if self.srf.field[x_ind, y_ind] > 0:
-                p.v = p.v + .075*self.srf.field[x_ind, y_ind]*self.dt
-            if self.srf.field[x_ind, y_ind] < 0:
-                p.v = p.v + .01*self.srf.field[x_ind, y_ind]*self.dt    
+            if self._field[x_ind, y_ind] > 0:
+                p.v = p.v + .075*self._field[x_ind, y_ind]*self.dt
+            if self._field[x_ind, y_ind] < 0:
+                p.v = p.v + .01*self._field[x_ind, y_ind]*self.dt
                 
     def advance(self):
         """Advance the animation by dt."""
-        for i, p in enumerate(self.particles):
-            if p.delete:
-                self.particles.remove(p)
-                self.n -=1
-            else:
-                p.advance(self.dt)
-                self.interact(p)
-        
+        self._sync_arrays()
+        self._prune_deleted()
+        if _hw1_step is not None:
+            # compiled kernel handles the stock particles end to end; agents
+            # keep their own advance/interact path
+            _hw1_step(self.R, self.V, self.rad, self.mass,
+                      self._field, self.dt,
+                      self._stock & self.alive)
+            for p in self.particles:
+                if not self._stock[p._i]:
+                    p.advance(self.dt)
+                    self.interact(p)
+        else:
+            self._advance_particles()
+            self._bounce_walls()
+            # one fancy-indexed field sample covers all the stock particles;
+            # the temperature-dependent multiplier becomes an np.where
+            stock = self._stock & self.alive
+            f = self._sample_field_all(self._field)
+            boost = np.where(f > 0, np.float32(.075), np.float32(.01))*f*self.dt
+            self.V[stock] += boost[stock][:, None]
+            for p in self.particles:
+                if not self._stock[p._i]:
+                    self.interact(p)
+
         self.handle_collisions()
-        
-               
+
+
 #inherits a simulation superclass that deals with animations etc.
 #now lets define the code for the environment and the agent! 
 #particles have a position and velocity, a temperature, some energy, and other parameters for plotting
@@ -572,20 +937,41 @@ class homeostasis_agent(Particle):
         self.r = np.array((x, y)).astype('float32')
         self.v = np.array((vx, vy)).astype('float32')
         self.radius = radius
-        self.mass = self.radius**2
+        self.mass = np.float32(self.radius**2)
         self.delete = False
         self.styles = styles
         if not self.styles:
             # Default circle styles
             self.styles = {'edgecolor': 'c', 'fill': False}
         self.food_store = food_store
-        self.temperature = 98; 
+        self.temperature = 98;
         self.set_point = 98 #homeostatic temp
         self.margin = 2
-        
-        self.temp_log = []
-        self.food_log = []
-    
+
+        # logs live in preallocated float32 buffers that double when full,
+        # so logging is an indexed write instead of a growing Python list
+        self._temp_log = np.empty(1024, dtype=np.float32)
+        self._food_log = np.empty(1024, dtype=np.float32)
+        self._log_len = 0
+
+    # expose the filled part of the buffers; plotting code can treat these
+    # like the lists they used to be
+    @property
+    def temp_log(self):
+        return self._temp_log[:self._log_len]
+
+    @property
+    def food_log(self):
+        return self._food_log[:self._log_len]
+
+    def _log(self):
+        if self._log_len == len(self._temp_log):
+            self._temp_log = np.resize(self._temp_log, 2*self._log_len)
+            self._food_log = np.resize(self._food_log, 2*self._log_len)
+        self._temp_log[self._log_len] = self.temperature
+        self._food_log[self._log_len] = self.food_store
+        self._log_len += 1
+
     def monitor(self):
         return self.temperature - self.set_point
     
@@ -607,8 +993,7 @@ class homeostasis_agent(Particle):
         self.v = .95*self.v
         
         self.move(dt, boost = 0)
-        self.temp_log.append(self.temperature)
-        self.food_log.append(self.food_store)
+        self._log()
         
         #this means we're dead!
         if self.food_store < 0:
@@ -1,6 +1,12 @@
+import functools
+
 import numpy as np
 import gstools as gs
 
+#generating the field runs the JBessel covariance model over the whole
+#100x100 grid, so cache the result per scale instead of redoing it for
+#every simulation
+@functools.lru_cache(maxsize=16)
 def generate_tempgrad(scale):
     # the grid -- this defines our world, now two dimensinoal!!
     nd = 100 #how many dimensions?
@@ -14,6 +20,7 @@ def generate_tempgrad(scale):
     srf((x, y), mesh_type="structured");
     return srf    
 
+@functools.lru_cache(maxsize=16)
 def generate_vectorfield(scale, xlim = 1, ylim = 1):
     ndx = 100 #how many dimensions?
     ndy = 100